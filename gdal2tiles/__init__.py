@@ -4,18 +4,23 @@ import os
 import math
 import tempfile
 import shutil
+from collections import OrderedDict
+from functools import lru_cache, partial
+from pathlib import Path
 from uuid import uuid4
-from xml.etree import ElementTree
-from multiprocessing import Pipe, Pool, Process, Manager
+from multiprocessing import Pipe, Pool, Process
 
 from osgeo import gdal
 from osgeo import osr
 
-from PIL import Image
-import numpy
-import osgeo.gdal_array as gdalarray
+try:
+    # Optional multi-node backend, used when this script is launched through
+    # mpiexec -n <ranks> python -m mpi4py.futures main.py ...
+    from mpi4py.futures import MPIPoolExecutor
+except ImportError:
+    MPIPoolExecutor = None
 
-from common import GDALError
+from common import GDALError, MAXZOOMLEVEL
 from geodetic import GlobalGeodetic
 from mercator import GlobalMercator
 
@@ -24,6 +29,95 @@ __version__ = "$Id: gdal2tiles.py 40194 2017-09-22 19:29:28Z rouault $"
 resampling_list = ('average', 'near', 'bilinear', 'cubic', 'cubicspline', 'lanczos', 'antialias')
 profile_list = ('mercator', 'geodetic', 'raster')
 webviewer_list = ('all', 'google', 'openlayers', 'leaflet', 'none')
+tile_format_list = ('png', 'webp')
+
+numpy = None
+gdalarray = None
+
+pyvips = None
+_pyvips_checked = False
+
+cv2 = None
+_cv2_checked = False
+
+
+def _load_pyvips():
+    """Imports pyvips on first use; returns None when it is not installed"""
+    global pyvips, _pyvips_checked
+    if not _pyvips_checked:
+        _pyvips_checked = True
+        try:
+            import pyvips as pyvips_
+            pyvips = pyvips_
+        except ImportError:
+            pyvips = None
+    return pyvips
+
+
+def _load_cv2():
+    """Imports OpenCV on first use; returns None when it is not installed"""
+    global cv2, _cv2_checked
+    if not _cv2_checked:
+        _cv2_checked = True
+        try:
+            import cv2 as cv2_
+            cv2 = cv2_
+        except ImportError:
+            cv2 = None
+    return cv2
+
+
+def _load_numpy():
+    """Imports numpy and gdal_array on first use - only the antialias path needs them"""
+    global numpy, gdalarray
+    if numpy is None:
+        import numpy as numpy_
+        import osgeo.gdal_array as gdalarray_
+        numpy = numpy_
+        gdalarray = gdalarray_
+    return numpy
+
+
+def set_gdal_runtime_defaults(cache_bytes=None):
+    """Applies the I/O and block-cache tuning every process needs
+
+    Called from main() and from the pool worker initializer: forked workers
+    inherit the parent's settings, but spawn and MPI workers start from a
+    clean slate. Anything already present in the environment wins
+    """
+    # Remote sources (COG over HTTP/S3) suffer badly from sibling-directory
+    # listings on every open and from unmerged range requests
+    for key, value in (
+            ('GDAL_DISABLE_READDIR_ON_OPEN', 'EMPTY_DIR'),
+            ('VSI_CACHE', 'TRUE'),
+            ('VSI_CACHE_SIZE', '268435456'),
+            ('GDAL_HTTP_MERGE_CONSECUTIVE_RANGES', 'YES'),
+            ('GDAL_HTTP_MULTIPLEX', 'YES'),
+            # O(1) block-cache lookups instead of a per-band array scan,
+            # which degrades on very wide rasters
+            ('GDAL_BAND_BLOCK_CACHE', 'HASHSET')):
+        if key not in os.environ:
+            gdal.SetConfigOption(key, value)
+    if cache_bytes:
+        gdal.SetCacheMax(cache_bytes)
+
+
+def gdal_cache_bytes_per_worker(options, nb_processes):
+    """Block-cache budget for one process, in bytes
+
+    A larger block cache avoids re-decoding source blocks shared by adjacent
+    tiles; the budget is split across workers so aggregate RSS stays bounded.
+    The GDAL_CACHEMAX environment variable overrides --gdal-cachemax
+    """
+    cache_max = os.environ.get('GDAL_CACHEMAX')
+    if cache_max is not None:
+        cache_max = int(cache_max)
+        if cache_max < 100000:
+            # small values are megabytes, as GDAL itself interprets them
+            cache_max *= 1024 * 1024
+    else:
+        cache_max = options.gdal_cachemax * 1024 * 1024
+    return max(1024 * 1024, cache_max // (nb_processes or 1))
 
 
 def exit_with_error(message, details=""):
@@ -148,6 +242,20 @@ def generate_kml(tx, ty, tz, tileext, tilesize, tileswne, options, children=None
     return s
 
 
+# Resampling kernel -> (GDAL algorithm, default query-window multiplier).
+# 'average' and 'antialias' do not go through gdal.ReprojectImage and have no
+# algorithm entry; the multipliers mirror each kernel's support footprint
+_RESAMPLE_TABLE = {
+    'near': (gdal.GRA_NearestNeighbour, 1),
+    'bilinear': (gdal.GRA_Bilinear, 2),
+    'cubic': (gdal.GRA_Cubic, 2),
+    'cubicspline': (gdal.GRA_CubicSpline, 2),
+    'lanczos': (gdal.GRA_Lanczos, 2),
+    'average': (None, 2),
+    'antialias': (None, 2),
+}
+
+
 def scale_query_to_tile(dsquery, dstile, tiledriver, options, tilefilename=''):
     """Scales down query dataset to the tile dataset"""
 
@@ -157,45 +265,51 @@ def scale_query_to_tile(dsquery, dstile, tiledriver, options, tilefilename=''):
 
     if options.resampling == 'average':
 
-        # Function: gdal.RegenerateOverview()
-        for i in range(1, tilebands + 1):
-            # Black border around NODATA
-            res = gdal.RegenerateOverview(dsquery.GetRasterBand(i), dstile.GetRasterBand(i),
-                                          'average')
-            if res != 0:
-                exit_with_error("RegenerateOverview() failed on %s, error %d" % (
-                    tilefilename, res))
+        if options.cv2 and _load_cv2() is not None:
+            # OpenCV's INTER_AREA box filter runs the 8-bit block-average with
+            # SIMD kernels, one call for all bands
+            _load_numpy()
+            array = numpy.transpose(dsquery.ReadAsArray(), (1, 2, 0))
+            resized = cv2.resize(array, (tilesize, tilesize),
+                                 interpolation=cv2.INTER_AREA)
+            dstile.WriteRaster(
+                0, 0, tilesize, tilesize,
+                numpy.ascontiguousarray(numpy.transpose(resized, (2, 0, 1))).tobytes(),
+                band_list=list(range(1, tilebands + 1)))
+        else:
+            # Function: gdal.RegenerateOverview()
+            for i in range(1, tilebands + 1):
+                # Black border around NODATA
+                res = gdal.RegenerateOverview(dsquery.GetRasterBand(i),
+                                              dstile.GetRasterBand(i), 'average')
+                if res != 0:
+                    exit_with_error("RegenerateOverview() failed on %s, error %d" % (
+                        tilefilename, res))
 
     elif options.resampling == 'antialias':
 
         # Scaling by PIL (Python Imaging Library) - improved Lanczos
-        array = numpy.zeros((querysize, querysize, tilebands), numpy.uint8)
-        for i in range(tilebands):
-            array[:, :, i] = gdalarray.BandReadAsArray(dsquery.GetRasterBand(i + 1),
-                                                       0, 0, querysize, querysize)
+        # PIL and numpy are only needed on this path, keep them out of module load
+        from PIL import Image
+        _load_numpy()
+
+        # One interleaved read for all bands instead of a BandReadAsArray
+        # call and an array copy per band
+        array = numpy.transpose(dsquery.ReadAsArray(), (1, 2, 0))
         im = Image.fromarray(array, 'RGBA')  # Always four bands
-        im1 = im.resize((tilesize, tilesize), Image.ANTIALIAS)
+        # Image.ANTIALIAS is a removed alias of LANCZOS on current Pillow.
+        # With pillow-simd installed this resize runs its AVX2 convolution
+        # path unchanged - it is a drop-in binary replacement
+        lanczos = getattr(getattr(Image, 'Resampling', Image), 'LANCZOS')
+        im1 = im.resize((tilesize, tilesize), lanczos)
         if os.path.exists(tilefilename):
             im0 = Image.open(tilefilename)
-            im1 = Image.composite(im1, im0, im1)
+            im1 = Image.alpha_composite(im0, im1)
         im1.save(tilefilename, tiledriver)
 
     else:
 
-        if options.resampling == 'near':
-            gdal_resampling = gdal.GRA_NearestNeighbour
-
-        elif options.resampling == 'bilinear':
-            gdal_resampling = gdal.GRA_Bilinear
-
-        elif options.resampling == 'cubic':
-            gdal_resampling = gdal.GRA_Cubic
-
-        elif options.resampling == 'cubicspline':
-            gdal_resampling = gdal.GRA_CubicSpline
-
-        elif options.resampling == 'lanczos':
-            gdal_resampling = gdal.GRA_Lanczos
+        gdal_resampling = _RESAMPLE_TABLE[options.resampling][0]
 
         # Other algorithms are implemented by gdal.ReprojectImage().
         dsquery.SetGeoTransform((0.0, tilesize / float(querysize), 0.0, 0.0, 0.0,
@@ -211,18 +325,19 @@ def setup_no_data_values(input_dataset, options):
     """
     Extract the NODATA values from the dataset or use the passed arguments as override if any
     """
-    in_nodata = []
+    raster_count = input_dataset.RasterCount
     if options.srcnodata:
         nds = list(map(float, options.srcnodata.split(',')))
-        if len(nds) < input_dataset.RasterCount:
-            in_nodata = (nds * input_dataset.RasterCount)[:input_dataset.RasterCount]
+        if len(nds) < raster_count:
+            in_nodata = (nds * raster_count)[:raster_count]
         else:
             in_nodata = nds
     else:
-        for i in range(1, input_dataset.RasterCount + 1):
-            raster_no_data = input_dataset.GetRasterBand(i).GetNoDataValue()
-            if raster_no_data is not None:
-                in_nodata.append(raster_no_data)
+        # One band fetch and one GetNoDataValue() per band - each is a
+        # Python->SWIG->C++ round-trip
+        bands = [input_dataset.GetRasterBand(i) for i in range(1, raster_count + 1)]
+        in_nodata = [nd for nd in (band.GetNoDataValue() for band in bands)
+                     if nd is not None]
 
     if options.verbose:
         print("NODATA: %s" % in_nodata)
@@ -257,6 +372,18 @@ def setup_input_srs(input_dataset, options):
     return input_srs, input_srs_wkt
 
 
+_srs4326 = None
+
+
+def srs_4326():
+    """Memoized EPSG:4326 SpatialReference - building one costs a PROJ lookup"""
+    global _srs4326
+    if _srs4326 is None:
+        _srs4326 = osr.SpatialReference()
+        _srs4326.ImportFromEPSG(4326)
+    return _srs4326
+
+
 def setup_output_srs(input_srs, options):
     """
     Setup the desired SRS (based on options)
@@ -278,207 +405,191 @@ def has_georeference(dataset):
             dataset.GetGCPCount() != 0)
 
 
-def reproject_dataset(from_dataset, from_srs, to_srs, options=None):
+def format_nodata_values(nodata_values):
+    """Space-separated NODATA list, integral values without a float tail
+
+    GetNoDataValue always hands back floats; Byte/integer rasters should not
+    end up with '0.0' in the warp arguments and metadata
+    """
+    return ' '.join('%d' % v if float(v).is_integer() else str(v)
+                    for v in nodata_values)
+
+
+def reproject_dataset(from_dataset, from_srs, to_srs, nodata_values=None, options=None):
     """
-    Returns the input dataset in the expected "destination" SRS.
-    If the dataset is already in the correct SRS, returns it unmodified
+    Returns the input dataset warped to the "destination" SRS as an in-memory VRT
+
+    A single gdal.Warp call sets up NODATA propagation (or a generated alpha
+    band for inputs without one) directly, where the previous
+    AutoCreateWarpedVRT path round-tripped the VRT through a temporary file
+    and patched its XML as text
     """
     if not from_srs or not to_srs:
         raise GDALError("from and to SRS must be defined to reproject the dataset")
 
-    if (from_srs.ExportToProj4() != to_srs.ExportToProj4()) or (from_dataset.GetGCPCount() != 0):
-        to_dataset = gdal.AutoCreateWarpedVRT(from_dataset,
-                                              from_srs.ExportToWkt(), to_srs.ExportToWkt())
+    warp_kwargs = {}
+    if nodata_values:
+        warp_kwargs['srcNodata'] = format_nodata_values(nodata_values)
+        warp_kwargs['warpOptions'] = ['INIT_DEST=NO_DATA', 'UNIFIED_SRC_NODATA=YES']
+    elif from_dataset.RasterCount in (1, 3):
+        # Equivalent of gdalwarp -dstalpha for inputs without an alpha band
+        warp_kwargs['dstAlpha'] = True
 
-        if options and options.verbose:
-            print("Warping of the raster by AutoCreateWarpedVRT (result saved into 'tiles.vrt')")
-            to_dataset.GetDriver().CreateCopy("tiles.vrt", to_dataset)
+    to_dataset = gdal.Warp('', from_dataset, format='VRT',
+                           srcSRS=from_srs.ExportToWkt(), dstSRS=to_srs.ExportToWkt(),
+                           **warp_kwargs)
 
-        return to_dataset
-    else:
-        return from_dataset
+    if nodata_values:
+        to_dataset.SetMetadataItem('NODATA_VALUES', format_nodata_values(nodata_values))
 
+    if options and options.verbose:
+        print("Warping of the raster by gdal.Warp (result saved into 'tiles.vrt')")
+        to_dataset.GetDriver().CreateCopy("tiles.vrt", to_dataset)
 
-def add_gdal_warp_options_to_string(vrt_string, warp_options):
-    if not warp_options:
-        return vrt_string
+    return to_dataset
 
-    vrt_root = ElementTree.fromstring(vrt_string)
-    options = vrt_root.find("GDALWarpOptions")
 
-    if options is None:
-        return vrt_string
+def nb_data_bands(dataset):
+    """
+    Return the number of data (non-alpha) bands of a gdal dataset
+    """
+    alphaband = dataset.GetRasterBand(1).GetMaskBand()
+    raster_count = dataset.RasterCount
+    if (alphaband.GetMaskFlags() & gdal.GMF_ALPHA) or raster_count in (2, 4):
+        return raster_count - 1
+    else:
+        return raster_count
 
-    for key, value in warp_options.items():
-        tb = ElementTree.TreeBuilder()
-        tb.start("Option", {"name": key})
-        tb.data(value)
-        tb.end("Option")
-        elem = tb.close()
-        options.insert(0, elem)
 
-    return ElementTree.tostring(vrt_root).decode()
+def tile_creation_options(tile_driver, options=None):
+    """Creation options for the tile output driver"""
+    if tile_driver == 'PNG':
+        # The PNG encoder dominates per-tile CPU, and tiles are commonly
+        # recompressed downstream (CDNs, caches) anyway - favor encode speed
+        # over the last few percent of deflate ratio
+        zlevel = options.zlevel if options is not None else 3
+        return ['ZLEVEL=%d' % zlevel]
+    if tile_driver == 'WEBP':
+        return ['QUALITY=85', 'LOSSLESS=FALSE']
+    return []
 
 
-def update_no_data_values(warped_vrt_dataset, nodata_values, options=None):
-    """
-    Takes an array of NODATA values and forces them on the WarpedVRT file dataset passed
+def pre_create_tile_directories(output_folder, tminmax, tminz, tmaxz):
     """
-    # TODO: gbataille - Seems that I forgot tests there
-    if nodata_values != []:
-        temp_file = gettempfilename('-gdal2tiles.vrt')
-        warped_vrt_dataset.GetDriver().CreateCopy(temp_file, warped_vrt_dataset)
-        with open(temp_file, 'r') as f:
-            vrt_string = f.read()
-
-        vrt_string = add_gdal_warp_options_to_string(
-            vrt_string, {"INIT_DEST": "NO_DATA", "UNIFIED_SRC_NODATA": "YES"})
-
-        # TODO: gbataille - check the need for this replacement. Seems to work without
-        #         # replace BandMapping tag for NODATA bands....
-        #         for i in range(len(nodata_values)):
-        #             s = s.replace(
-        #                 '<BandMapping src="%i" dst="%i"/>' % ((i+1), (i+1)),
-        #                 """
-        # <BandMapping src="%i" dst="%i">
-        # <SrcNoDataReal>%i</SrcNoDataReal>
-        # <SrcNoDataImag>0</SrcNoDataImag>
-        # <DstNoDataReal>%i</DstNoDataReal>
-        # <DstNoDataImag>0</DstNoDataImag>
-        # </BandMapping>
-        #                 """ % ((i+1), (i+1), nodata_values[i], nodata_values[i]))
-
-        # save the corrected VRT
-        with open(temp_file, 'w') as f:
-            f.write(vrt_string)
-
-        corrected_dataset = gdal.Open(temp_file)
-        os.unlink(temp_file)
-
-        # set NODATA_VALUE metadata
-        corrected_dataset.SetMetadataItem(
-            'NODATA_VALUES', ' '.join([str(i) for i in nodata_values]))
-
-        if options and options.verbose:
-            print("Modified warping result saved into 'tiles1.vrt'")
-            # TODO: gbataille - test replacing that with a gdal write of the dataset (more
-            # accurately what's used, even if should be the same
-            with open("tiles1.vrt", "w") as f:
-                f.write(vrt_string)
-
-        return corrected_dataset
-
-
-def add_alpha_band_to_string_vrt(vrt_string):
-    # TODO: gbataille - Old code speak of this being equivalent to gdalwarp -dstalpha
-    # To be checked
-
-    vrt_root = ElementTree.fromstring(vrt_string)
-
-    index = 0
-    nb_bands = 0
-    for subelem in list(vrt_root):
-        if subelem.tag == "VRTRasterBand":
-            nb_bands += 1
-            color_node = subelem.find("./ColorInterp")
-            if color_node is not None and color_node.text == "Alpha":
-                raise Exception("Alpha band already present")
-        else:
-            if nb_bands:
-                # This means that we are one element after the Band definitions
-                break
-
-        index += 1
-
-    tb = ElementTree.TreeBuilder()
-    tb.start("VRTRasterBand",
-             {'dataType': "Byte", "band": str(nb_bands + 1), "subClass": "VRTWarpedRasterBand"})
-    tb.start("ColorInterp", {})
-    tb.data("Alpha")
-    tb.end("ColorInterp")
-    tb.end("VRTRasterBand")
-    elem = tb.close()
-
-    vrt_root.insert(index, elem)
-
-    warp_options = vrt_root.find(".//GDALWarpOptions")
-    tb = ElementTree.TreeBuilder()
-    tb.start("DstAlphaBand", {})
-    tb.data(str(nb_bands + 1))
-    tb.end("DstAlphaBand")
-    elem = tb.close()
-    warp_options.append(elem)
-
-    # TODO: gbataille - this is a GDALWarpOptions. Why put it in a specific place?
-    tb = ElementTree.TreeBuilder()
-    tb.start("Option", {"name": "INIT_DEST"})
-    tb.data("0")
-    tb.end("Option")
-    elem = tb.close()
-    warp_options.append(elem)
-
-    return ElementTree.tostring(vrt_root).decode()
-
-
-def update_alpha_value_for_non_alpha_inputs(warped_vrt_dataset, options=None):
-    """
-    Handles dataset with 1 or 3 bands, i.e. without alpha channel, in the case the nodata value has
-    not been forced by options
+    Creates every z/x tile directory up front, on a single process
+
+    Workers can then assume their tile directory exists, which avoids a
+    stat+mkdir round-trip per tile - costly on networked filesystems
     """
-    if warped_vrt_dataset.RasterCount in [1, 3]:
-        tempfilename = gettempfilename('-gdal2tiles.vrt')
-        warped_vrt_dataset.GetDriver().CreateCopy(tempfilename, warped_vrt_dataset)
-        with open(tempfilename) as f:
-            orig_data = f.read()
-        alpha_data = add_alpha_band_to_string_vrt(orig_data)
-        with open(tempfilename, 'w') as f:
-            f.write(alpha_data)
+    for tz in range(tminz, tmaxz + 1):
+        tminx, tminy, tmaxx, tmaxy = tminmax[tz]
+        for tx in range(tminx, tmaxx + 1):
+            os.makedirs(os.path.join(output_folder, str(tz), str(tx)), exist_ok=True)
 
-        warped_vrt_dataset = gdal.Open(tempfilename)
-        os.unlink(tempfilename)
 
-        if options and options.verbose:
-            print("Modified -dstalpha warping result saved into 'tiles1.vrt'")
-            # TODO: gbataille - test replacing that with a gdal write of the dataset (more
-            # accurately what's used, even if should be the same
-            with open("tiles1.vrt", "w") as f:
-                f.write(alpha_data)
+# Per-process state set up once by _init_worker and reused for every tile the
+# worker processes, instead of once per tile
+_worker_src_ds = None
+_worker_alpha_band = None
+_worker_alpha_is_band = False
+_worker_tile_swne = None
 
-    return warped_vrt_dataset
 
+def _worker_swne(tile_job_info, options):
+    """Tile SWNE resolver, built once per worker process
 
-def nb_data_bands(dataset):
+    get_tile_swne sets up coordinate transforms and a memoizing closure for
+    the raster profile; rebuilding it per tile would throw that cache away
     """
-    Return the number of data (non-alpha) bands of a gdal dataset
+    global _worker_tile_swne
+    if _worker_tile_swne is None:
+        _worker_tile_swne = get_tile_swne(tile_job_info, options)
+    return _worker_tile_swne
+
+_mem_ds_cache = {}
+
+# Recently-decoded child tiles for the overview pass, keyed (tz, tx, ty).
+# Horizontally adjacent parents share two children, so roughly every second
+# child open within a row is served from here instead of re-decoding the PNG.
+# 128 RGBA 256px tiles keep the cache around 32 MB per worker
+_child_tile_cache = OrderedDict()
+_CHILD_TILE_CACHE_ENTRIES = 128
+
+# Directory listings for the --resume check in overview workers, one readdir
+# per (zoom, column) directory instead of one stat per tile. Only valid for
+# the resume check: it lists what existed before this run started on the
+# directory, and every missing tile is dispatched exactly once afterwards
+_resume_dir_cache = {}
+
+
+def _resume_existing_names(dir_path):
+    names = _resume_dir_cache.get(dir_path)
+    if names is None:
+        try:
+            names = frozenset(e.name for e in os.scandir(dir_path))
+        except FileNotFoundError:
+            names = frozenset()
+        _resume_dir_cache[dir_path] = names
+    return names
+
+
+def _read_child_tile(path, tz, tx, ty, tile_size):
+    """Raster bytes of an already-written child tile, cached per worker
+
+    Tiles at a zoom level are complete (and immutable) before the level
+    above is built, so cached reads can never go stale within a run
     """
-    alphaband = dataset.GetRasterBand(1).GetMaskBand()
-    if ((alphaband.GetMaskFlags() & gdal.GMF_ALPHA) or
-                dataset.RasterCount == 4 or
-                dataset.RasterCount == 2):
-        return dataset.RasterCount - 1
+    key = (tz, tx, ty)
+    data = _child_tile_cache.pop(key, None)
+    if data is None:
+        ds = gdal.Open(path, gdal.GA_ReadOnly)
+        data = ds.ReadRaster(0, 0, tile_size, tile_size)
+        if len(_child_tile_cache) >= _CHILD_TILE_CACHE_ENTRIES:
+            _child_tile_cache.popitem(last=False)
+    _child_tile_cache[key] = data
+    return data
+
+
+def _mem_dataset(size, bands):
+    """Reusable per-process MEM dataset of the given square size, zeroed
+
+    Tiles within a run come in a handful of fixed shapes; resetting a cached
+    dataset with Fill(0) is cheaper than a Create/destroy pair per tile
+    """
+    key = (size, bands)
+    ds = _mem_ds_cache.get(key)
+    if ds is None:
+        ds = gdal.GetDriverByName('MEM').Create('', size, size, bands)
+        _mem_ds_cache[key] = ds
     else:
-        return dataset.RasterCount
+        for b in range(1, bands + 1):
+            ds.GetRasterBand(b).Fill(0)
+    return ds
 
 
-def gettempfilename(suffix):
-    """Returns a temporary filename"""
-    if '_' in os.environ:
-        # tempfile.mktemp() crashes on some Wine versions (the one of Ubuntu 12.04 particularly)
-        if os.environ['_'].find('wine') >= 0:
-            tmpdir = '.'
-            if 'TMP' in os.environ:
-                tmpdir = os.environ['TMP']
-            import time
-            import random
-            random.seed(time.time())
-            random_part = 'file%d' % random.randint(0, 1000000000)
-            return os.path.join(tmpdir, random_part + suffix)
+def _init_worker(src_file, cache_bytes=None):
+    """One-time per-worker setup: register drivers and open the source dataset
 
-    return tempfile.mktemp(suffix)
+    Passed as Pool(initializer=...) so driver registration and the dataset
+    open (PROJ/SRS parsing, header reads) happen once per worker process
+    rather than once per tile. The long-lived handle also keeps its block
+    cache warm across the tiles a worker processes
+    """
+    global _worker_src_ds, _worker_alpha_band, _worker_alpha_is_band
+    set_gdal_runtime_defaults(cache_bytes)
+    gdal.AllRegister()
+    _worker_src_ds = gdal.Open(src_file, gdal.GA_ReadOnly)
+    first_band = _worker_src_ds.GetRasterBand(1)
+    _worker_alpha_band = first_band.GetMaskBand()
+    # When the mask is a real alpha band of the dataset, data and alpha can
+    # be fetched with a single ReadRaster instead of two
+    _worker_alpha_is_band = (first_band.GetMaskFlags() & gdal.GMF_ALPHA) != 0
 
 
-def create_base_tile(tile_job_info, tile_detail, queue=None):
-    gdal.AllRegister()
+def create_base_tile(tile_job_info, tile_detail):
+    if _worker_src_ds is None:
+        # Single-process path, or a pool created without the initializer
+        _init_worker(tile_job_info.src_file)
 
     dataBandsCount = tile_job_info.nb_data_bands
     output = tile_job_info.output_file_path
@@ -487,10 +598,13 @@ def create_base_tile(tile_job_info, tile_detail, queue=None):
     options = tile_job_info.options
 
     tilebands = dataBandsCount + 1
-    ds = gdal.Open(tile_job_info.src_file, gdal.GA_ReadOnly)
-    mem_drv = gdal.GetDriverByName('MEM')
+    # Built once per tile instead of once per ReadRaster/WriteRaster call
+    data_band_list = list(range(1, dataBandsCount + 1))
+    alpha_band_list = [tilebands]
+    all_band_list = list(range(1, tilebands + 1))
+    ds = _worker_src_ds
     out_drv = gdal.GetDriverByName(tile_job_info.tile_driver)
-    alphaband = ds.GetRasterBand(1).GetMaskBand()
+    alphaband = _worker_alpha_band
 
     tx = tile_detail.tx
     ty = tile_detail.ty
@@ -508,7 +622,7 @@ def create_base_tile(tile_job_info, tile_detail, queue=None):
     # Tile dataset in memory
     tilefilename = os.path.join(
         output, str(tz), str(tx), "%s.%s" % (ty, tileext))
-    dstile = mem_drv.Create('', tilesize, tilesize, tilebands)
+    dstile = _mem_dataset(tilesize, tilebands)
 
     data = alpha = None
 
@@ -519,19 +633,42 @@ def create_base_tile(tile_job_info, tile_detail, queue=None):
     # Query is in 'nearest neighbour' but can be bigger in then the tilesize
     # We scale down the query to the tilesize by supplied algorithm.
 
+    # When the source's alpha is one of its own bands, read data and alpha in
+    # a single call - one compressed-block decode instead of two. A true mask
+    # band lives outside the dataset's band list and still needs its own read
+    combined_alpha = _worker_alpha_is_band and ds.RasterCount == tilebands
+
     if rxsize != 0 and rysize != 0 and wxsize != 0 and wysize != 0:
-        data = ds.ReadRaster(rx, ry, rxsize, rysize, wxsize, wysize,
-                             band_list=list(range(1, dataBandsCount + 1)))
-        alpha = alphaband.ReadRaster(rx, ry, rxsize, rysize, wxsize, wysize)
+        if combined_alpha:
+            data = ds.ReadRaster(rx, ry, rxsize, rysize, wxsize, wysize,
+                                 band_list=all_band_list)
+            # Bands are laid out sequentially - the tail of the buffer is
+            # the alpha band, needed below for the all-transparent skip
+            alpha = data[-(len(data) // tilebands):]
+        else:
+            data = ds.ReadRaster(rx, ry, rxsize, rysize, wxsize, wysize,
+                                 band_list=data_band_list)
+            alpha = alphaband.ReadRaster(rx, ry, rxsize, rysize, wxsize, wysize)
+
+    # Tiles lying entirely in the nodata area of the raster have an all-zero
+    # alpha mask. Skip the encode and write for those - clients render a
+    # missing tile exactly like a fully transparent one
+    if data is None or not alpha.strip(b'\x00'):
+        return
 
     # The tile in memory is a transparent file by default. Write pixel values into it if
     # any
     if data:
         if tilesize == querysize:
             # Use the ReadRaster result directly in tiles ('nearest neighbour' query)
-            dstile.WriteRaster(wx, wy, wxsize, wysize, data,
-                               band_list=list(range(1, dataBandsCount + 1)))
-            dstile.WriteRaster(wx, wy, wxsize, wysize, alpha, band_list=[tilebands])
+            if combined_alpha:
+                dstile.WriteRaster(wx, wy, wxsize, wysize, data,
+                                   band_list=all_band_list)
+            else:
+                dstile.WriteRaster(wx, wy, wxsize, wysize, data,
+                                   band_list=data_band_list)
+                dstile.WriteRaster(wx, wy, wxsize, wysize, alpha,
+                                   band_list=alpha_band_list)
 
             # Note: For source drivers based on WaveLet compression (JPEG2000, ECW,
             # MrSID) the ReadRaster function returns high-quality raster (not ugly
@@ -540,27 +677,27 @@ def create_base_tile(tile_job_info, tile_detail, queue=None):
         else:
             # Big ReadRaster query in memory scaled to the tilesize - all but 'near'
             # algo
-            dsquery = mem_drv.Create('', querysize, querysize, tilebands)
+            dsquery = _mem_dataset(querysize, tilebands)
             # TODO: fill the null value in case a tile without alpha is produced (now
             # only png tiles are supported)
-            dsquery.WriteRaster(wx, wy, wxsize, wysize, data,
-                                band_list=list(range(1, dataBandsCount + 1)))
-            dsquery.WriteRaster(wx, wy, wxsize, wysize, alpha, band_list=[tilebands])
+            if combined_alpha:
+                dsquery.WriteRaster(wx, wy, wxsize, wysize, data,
+                                    band_list=all_band_list)
+            else:
+                dsquery.WriteRaster(wx, wy, wxsize, wysize, data,
+                                    band_list=data_band_list)
+                dsquery.WriteRaster(wx, wy, wxsize, wysize, alpha,
+                                    band_list=alpha_band_list)
 
             scale_query_to_tile(dsquery, dstile, tile_job_info.tile_driver, options,
                                 tilefilename=tilefilename)
-            del dsquery
 
-    # Force freeing the memory to make sure the C++ destructor is called and the memory as well as
-    # the file locks are released
-    del ds
     del data
 
     if options.resampling != 'antialias':
         # Write a copy of tile to png/jpg
-        out_drv.CreateCopy(tilefilename, dstile, strict=0)
-
-    del dstile
+        out_drv.CreateCopy(tilefilename, dstile, strict=0,
+                           options=tile_creation_options(tile_job_info.tile_driver, options))
 
     # Create a KML file for this tile.
     if tile_job_info.kml:
@@ -569,20 +706,115 @@ def create_base_tile(tile_job_info, tile_detail, queue=None):
             with open(kmlfilename, 'wb') as f:
                 f.write(generate_kml(
                     tx, ty, tz, tile_job_info.tile_extension, tile_job_info.tile_size,
-                    tile_job_info.tile_swne, tile_job_info.options
+                    _worker_swne(tile_job_info, options), options
                 ).encode('utf-8'))
 
-    if queue:
-        queue.put("tile %s %s %s" % (tx, ty, tz))
-
 
-def create_overview_tiles(tile_job_info, output_folder, options):
-    """Generation of the overview tiles (higher in the pyramid) based on existing tiles"""
-    mem_driver = gdal.GetDriverByName('MEM')
+def create_overview_tile(tile_job_info, output_folder, options, tz, tx, ty):
+    """Generates one overview tile from the four underlying tiles"""
     tile_driver = tile_job_info.tile_driver
     out_driver = gdal.GetDriverByName(tile_driver)
 
     tilebands = tile_job_info.nb_data_bands + 1
+    all_band_list = list(range(1, tilebands + 1))
+
+    tile_dir = os.path.join(output_folder, str(tz), str(tx))
+    tile_name = "%s.%s" % (ty, tile_job_info.tile_extension)
+    tilefilename = os.path.join(tile_dir, tile_name)
+
+    if options.verbose:
+        print(tilefilename)
+
+    if options.resume and tile_name in _resume_existing_names(tile_dir):
+        if options.verbose:
+            print("Tile generation skipped because of --resume")
+        return
+
+    minx, miny, maxx, maxy = tile_job_info.tminmax[tz + 1]
+
+    children = []
+    child_paths = {}
+    child_zoom_dir = os.path.join(output_folder, str(tz + 1))
+    for y in range(2 * ty, 2 * ty + 2):
+        for x in range(2 * tx, 2 * tx + 2):
+            if x >= minx and x <= maxx and y >= miny and y <= maxy:
+                child_path = os.path.join(
+                    child_zoom_dir, str(x),
+                    "%s.%s" % (y, tile_job_info.tile_extension))
+                # Fully transparent children are never written at all
+                if os.path.exists(child_path):
+                    children.append([x, y, tz + 1])
+                    child_paths[(x, y)] = child_path
+
+    if not children:
+        # Entirely in the nodata area - propagate the skip up the pyramid
+        return
+
+    if (options.resampling == 'average' and len(children) == 4 and
+            tile_job_info.tile_driver == 'PNG' and _load_pyvips() is not None):
+        # libvips runs decode -> shrink -> encode as one streaming pipeline with
+        # SIMD reduce kernels, considerably faster than the MEM-dataset detour.
+        # Children ordered top-left, top-right, bottom-left, bottom-right
+        # (TMS y counts upwards, image rows count downwards)
+        order = ((2 * tx, 2 * ty + 1), (2 * tx + 1, 2 * ty + 1),
+                 (2 * tx, 2 * ty), (2 * tx + 1, 2 * ty))
+        tiles = [pyvips.Image.new_from_file(child_paths[k], access='sequential')
+                 for k in order]
+        pyvips.Image.arrayjoin(tiles, across=2).shrink(2, 2).pngsave(
+            tilefilename, compression=options.zlevel)
+    else:
+        dsquery = _mem_dataset(2 * tile_job_info.tile_size, tilebands)
+        # TODO: fill the null value
+        dstile = _mem_dataset(tile_job_info.tile_size, tilebands)
+
+        # TODO: Implement more clever walking on the tiles with cache functionality
+        # probably walk should start with reading of four tiles from top left corner
+        # Hilbert curve
+
+        # Read the tiles and write them to query window
+        for y in range(2 * ty, 2 * ty + 2):
+            for x in range(2 * tx, 2 * tx + 2):
+                if (x, y) not in child_paths:
+                    continue
+                # Placement only depends on the child's parity: the right
+                # column goes to the right half, the upper TMS row to the
+                # upper image half (image rows count downwards)
+                tileposx = (x & 1) * tile_job_info.tile_size
+                tileposy = (1 - (y & 1)) * tile_job_info.tile_size
+                dsquery.WriteRaster(
+                    tileposx, tileposy, tile_job_info.tile_size,
+                    tile_job_info.tile_size,
+                    _read_child_tile(child_paths[(x, y)], tz + 1, x, y,
+                                     tile_job_info.tile_size),
+                    band_list=all_band_list)
+
+        scale_query_to_tile(dsquery, dstile, tile_driver, options,
+                            tilefilename=tilefilename)
+        # Write a copy of tile to png/jpg
+        if options.resampling != 'antialias':
+            # Write a copy of tile to png/jpg
+            out_driver.CreateCopy(tilefilename, dstile, strict=0,
+                                  options=tile_creation_options(tile_driver, options))
+
+    if options.verbose:
+        print("\tbuild from zoom", tz + 1,
+              " tiles:", (2 * tx, 2 * ty), (2 * tx + 1, 2 * ty),
+              (2 * tx, 2 * ty + 1), (2 * tx + 1, 2 * ty + 1))
+
+    # Create a KML file for this tile.
+    if tile_job_info.kml:
+        with open(os.path.join(
+                output_folder,
+                        '%d/%d/%d.kml' % (tz, tx, ty)
+        ), 'wb') as f:
+            f.write(generate_kml(
+                tx, ty, tz, tile_job_info.tile_extension, tile_job_info.tile_size,
+                _worker_swne(tile_job_info, options), options, children
+            ).encode('utf-8'))
+
+
+def create_overview_tiles(tile_job_info, output_folder, options, pool=None):
+    """Generation of the overview tiles (higher in the pyramid) based on existing tiles"""
 
     # Usage of existing tiles: from 4 underlying tiles generate one as overview.
 
@@ -591,8 +823,6 @@ def create_overview_tiles(tile_job_info, output_folder, options):
         tminx, tminy, tmaxx, tmaxy = tile_job_info.tminmax[tz]
         tcount += (1 + abs(tmaxx - tminx)) * (1 + abs(tmaxy - tminy))
 
-    ti = 0
-
     if tcount == 0:
         return
 
@@ -602,93 +832,27 @@ def create_overview_tiles(tile_job_info, output_folder, options):
     progress_bar = ProgressBar(tcount)
     progress_bar.start()
 
+    # Tiles within one zoom level are independent of each other, but a zoom level can only be
+    # built once the zoom level below it is complete, so each level is a synchronization barrier
     for tz in range(tile_job_info.tmaxz - 1, tile_job_info.tminz - 1, -1):
         tminx, tminy, tmaxx, tmaxy = tile_job_info.tminmax[tz]
-        for ty in range(tmaxy, tminy - 1, -1):
-            for tx in range(tminx, tmaxx + 1):
-
-                ti += 1
-                tilefilename = os.path.join(output_folder,
-                                            str(tz),
-                                            str(tx),
-                                            "%s.%s" % (ty, tile_job_info.tile_extension))
-
-                if options.verbose:
-                    print(ti, '/', tcount, tilefilename)
-
-                if options.resume and os.path.exists(tilefilename):
-                    if options.verbose:
-                        print("Tile generation skipped because of --resume")
-                    else:
-                        progress_bar.log_progress()
-                    continue
-
-                # Create directories for the tile
-                if not os.path.exists(os.path.dirname(tilefilename)):
-                    os.makedirs(os.path.dirname(tilefilename))
-
-                dsquery = mem_driver.Create('', 2 * tile_job_info.tile_size,
-                                            2 * tile_job_info.tile_size, tilebands)
-                # TODO: fill the null value
-                dstile = mem_driver.Create('', tile_job_info.tile_size, tile_job_info.tile_size,
-                                           tilebands)
-
-                # TODO: Implement more clever walking on the tiles with cache functionality
-                # probably walk should start with reading of four tiles from top left corner
-                # Hilbert curve
-
-                children = []
-                # Read the tiles and write them to query window
-                for y in range(2 * ty, 2 * ty + 2):
-                    for x in range(2 * tx, 2 * tx + 2):
-                        minx, miny, maxx, maxy = tile_job_info.tminmax[tz + 1]
-                        if x >= minx and x <= maxx and y >= miny and y <= maxy:
-                            dsquerytile = gdal.Open(
-                                os.path.join(output_folder, str(tz + 1), str(x),
-                                             "%s.%s" % (y, tile_job_info.tile_extension)),
-                                gdal.GA_ReadOnly)
-                            if (ty == 0 and y == 1) or (ty != 0 and (y % (2 * ty)) != 0):
-                                tileposy = 0
-                            else:
-                                tileposy = tile_job_info.tile_size
-                            if tx:
-                                tileposx = x % (2 * tx) * tile_job_info.tile_size
-                            elif tx == 0 and x == 1:
-                                tileposx = tile_job_info.tile_size
-                            else:
-                                tileposx = 0
-                            dsquery.WriteRaster(
-                                tileposx, tileposy, tile_job_info.tile_size,
-                                tile_job_info.tile_size,
-                                dsquerytile.ReadRaster(0, 0,
-                                                       tile_job_info.tile_size,
-                                                       tile_job_info.tile_size),
-                                band_list=list(range(1, tilebands + 1)))
-                            children.append([x, y, tz + 1])
-
-                scale_query_to_tile(dsquery, dstile, tile_driver, options,
-                                    tilefilename=tilefilename)
-                # Write a copy of tile to png/jpg
-                if options.resampling != 'antialias':
-                    # Write a copy of tile to png/jpg
-                    out_driver.CreateCopy(tilefilename, dstile, strict=0)
-
-                if options.verbose:
-                    print("\tbuild from zoom", tz + 1,
-                          " tiles:", (2 * tx, 2 * ty), (2 * tx + 1, 2 * ty),
-                          (2 * tx, 2 * ty + 1), (2 * tx + 1, 2 * ty + 1))
-
-                # Create a KML file for this tile.
-                if tile_job_info.kml:
-                    with open(os.path.join(
-                            output_folder,
-                                    '%d/%d/%d.kml' % (tz, tx, ty)
-                    ), 'wb') as f:
-                        f.write(generate_kml(
-                            tx, ty, tz, tile_job_info.tile_extension, tile_job_info.tile_size,
-                            get_tile_swne(tile_job_info, options), options, children
-                        ).encode('utf-8'))
+        tiles = [(tx, ty)
+                 for ty in range(tmaxy, tminy - 1, -1)
+                 for tx in range(tminx, tmaxx + 1)]
 
+        if pool is None:
+            for tx, ty in tiles:
+                create_overview_tile(tile_job_info, output_folder, options, tz, tx, ty)
+                if not options.verbose and not options.quiet:
+                    progress_bar.log_progress()
+        else:
+            results = [
+                pool.apply_async(create_overview_tile,
+                                 (tile_job_info, output_folder, options, tz, tx, ty))
+                for tx, ty in tiles
+            ]
+            for result in results:
+                result.get()
                 if not options.verbose and not options.quiet:
                     progress_bar.log_progress()
 
@@ -726,7 +890,13 @@ def optparse_init():
     p.add_option("--processes",
                  dest="nb_processes",
                  type='int',
-                 help="Number of processes to use for tiling")
+                 help="Number of processes to use for tiling - default the number of CPUs")
+    p.add_option("--chunksize",
+                 dest="chunksize",
+                 type='int',
+                 help=("Number of tiles per multiprocessing work unit - default 4. "
+                       "Small chunks keep workers busy at the tail of a job, use 1 for "
+                       "very uneven per-tile times"))
 
     # KML options
     g = OptionGroup(p, "KML (Google Earth) options",
@@ -756,10 +926,30 @@ def optparse_init():
                  help="Bing Maps API key from https://www.bingmapsportal.com/")
     p.add_option_group(g)
 
+    p.add_option("--cv2", dest="cv2", action="store_true",
+                 help="Use OpenCV's SIMD INTER_AREA kernel for 'average' resampling "
+                      "(requires opencv-python)")
+    p.add_option("--querysize-factor", dest="querysize_factor", type='int',
+                 help=("Read a window this many times the tile size from the source "
+                       "when scaling down (default: 1 for near/bilinear, 2 otherwise; "
+                       "4 restores the old, slower behaviour)"))
+    p.add_option("--gdal-cachemax", dest="gdal_cachemax", type='int',
+                 help=("GDAL raster block cache size in megabytes, shared out across "
+                       "worker processes (default 512). Larger caches avoid re-decoding "
+                       "source blocks that adjacent tile queries touch repeatedly"))
+    p.add_option("--format", dest='tile_format',
+                 type='choice', choices=tile_format_list,
+                 help=("Tile output format (%s) - default 'png'. WebP encodes "
+                       "faster and produces smaller tiles" % ",".join(tile_format_list)))
+    p.add_option("--zlevel", dest="zlevel", type='int',
+                 help=("PNG deflate level 1-9 - default 3. 1 is fastest, 9 "
+                       "smallest; has no effect for WebP tiles"))
+
     p.set_defaults(verbose=False, profile="mercator", kml=False, url='',
                    webviewer='all', copyright='', resampling='average', resume=False,
                    googlekey='INSERT_YOUR_KEY_HERE', bingkey='INSERT_YOUR_KEY_HERE',
-                   processes=1)
+                   nb_processes=os.cpu_count() or 1, chunksize=4, tile_format='png',
+                   gdal_cachemax=512, cv2=False, zlevel=3)
 
     return p
 
@@ -813,12 +1003,23 @@ def options_post_processing(options, input_file, output_folder):
 
     elif options.resampling == 'antialias':
         try:
-            if numpy:  # pylint:disable=W0125
-                pass
-        except Exception:
+            from PIL import Image  # noqa
+            _load_numpy()
+        except ImportError:
             exit_with_error("'antialias' resampling algorithm is not available.",
                             "Install PIL (Python Imaging Library) and numpy.")
 
+    if options.cv2 and _load_cv2() is None:
+        exit_with_error("--cv2 was requested but OpenCV is not available.",
+                        "Install opencv-python or drop the --cv2 flag.")
+
+    if not 1 <= options.zlevel <= 9:
+        exit_with_error("--zlevel must be between 1 and 9.")
+
+    if options.tile_format == 'webp' and gdal.GetDriverByName('WEBP') is None:
+        exit_with_error("'webp' tile format is not available.",
+                        "Please use --format 'png' or rebuild GDAL with WebP support.")
+
     try:
         os.path.basename(input_file).encode('ascii')
     except UnicodeEncodeError:
@@ -941,8 +1142,12 @@ class GDAL2Tiles(object):
 
         # Tile format
         self.tilesize = 256
-        self.tiledriver = 'PNG'
-        self.tileext = 'png'
+        if options.tile_format == 'webp':
+            self.tiledriver = 'WEBP'
+            self.tileext = 'webp'
+        else:
+            self.tiledriver = 'PNG'
+            self.tileext = 'png'
         self.tmp_dir = tempfile.mkdtemp()
         self.tmp_vrt_filename = os.path.join(self.tmp_dir, str(uuid4()) + '.vrt')
 
@@ -952,9 +1157,6 @@ class GDAL2Tiles(object):
         # Not for Wavelet based drivers (JPEG2000, ECW, MrSID)
         # Not for 'raster' profile
         self.scaledquery = True
-        # How big should be query window be for scaling down
-        # Later on reset according the chosen resampling algorightm
-        self.querysize = 4 * self.tilesize
 
         # Should we use Read on the input file for generating overview tiles?
         # Note: Modified later by open_input()
@@ -965,11 +1167,13 @@ class GDAL2Tiles(object):
         self.output_folder = output_folder
         self.options = options
 
-        if self.options.resampling == 'near':
-            self.querysize = self.tilesize
-
-        elif self.options.resampling == 'bilinear':
-            self.querysize = self.tilesize * 2
+        # How big the query window should be when scaling down. The query reads
+        # factor^2 times the pixel footprint of the output tile, so keep it as
+        # small as the resampling kernel allows. --querysize-factor overrides
+        # (4 restores the historic behaviour)
+        factor = (self.options.querysize_factor or
+                  _RESAMPLE_TABLE[self.options.resampling][1])
+        self.querysize = self.tilesize * factor
 
         # User specified zoom levels
         self.tminz = None
@@ -1063,17 +1267,11 @@ class GDAL2Tiles(object):
                     "software for georeference e.g. gdal_transform -gcp / -a_ullr / -a_srs"
                 )
 
-            if ((in_srs.ExportToProj4() != self.out_srs.ExportToProj4()) or
-                    (input_dataset.GetGCPCount() != 0)):
+            # IsSame is a structural comparison in C, no PROJ4 text round-trip
+            if (not in_srs.IsSame(self.out_srs)) or input_dataset.GetGCPCount() != 0:
                 self.warped_input_dataset = reproject_dataset(
-                    input_dataset, in_srs, self.out_srs)
-
-                if in_nodata:
-                    self.warped_input_dataset = update_no_data_values(
-                        self.warped_input_dataset, in_nodata, options=self.options)
-                else:
-                    self.warped_input_dataset = update_alpha_value_for_non_alpha_inputs(
-                        self.warped_input_dataset, options=self.options)
+                    input_dataset, in_srs, self.out_srs,
+                    nodata_values=in_nodata, options=self.options)
 
             if self.warped_input_dataset and self.options.verbose:
                 print("Projected file:", "tiles.vrt", "( %sP x %sL - %s bands)" % (
@@ -1091,11 +1289,19 @@ class GDAL2Tiles(object):
         self.alphaband = self.warped_input_dataset.GetRasterBand(1).GetMaskBand()
         self.dataBandsCount = nb_data_bands(self.warped_input_dataset)
 
+        # GDAL's WEBP driver only writes 3 or 4 band rasters; catch greyscale
+        # sources here instead of failing on every CreateCopy mid-run
+        if self.options.tile_format == 'webp' and self.dataBandsCount + 1 not in (3, 4):
+            exit_with_error(
+                "'webp' tiles require a 3 or 4 band source.",
+                "This input would produce %d-band tiles. Convert it to RGB(A) first "
+                "(e.g. gdal_translate -expand rgb) or use --format 'png'."
+                % (self.dataBandsCount + 1))
+
         # KML test
         self.isepsg4326 = False
-        srs4326 = osr.SpatialReference()
-        srs4326.ImportFromEPSG(4326)
-        if self.out_srs and srs4326.ExportToProj4() == self.out_srs.ExportToProj4():
+        srs4326 = srs_4326()
+        if self.out_srs and srs4326.IsSame(self.out_srs):
             self.kml = True
             self.isepsg4326 = True
             if self.options.verbose:
@@ -1103,6 +1309,9 @@ class GDAL2Tiles(object):
 
         # Read the georeference
         self.out_gt = self.warped_input_dataset.GetGeoTransform()
+        # Pixel-size inverses for geo_query, computed once per run
+        self._inv_gt1 = 1.0 / self.out_gt[1]
+        self._inv_gt5 = 1.0 / self.out_gt[5]
 
         # Test the size of the pixel
 
@@ -1131,15 +1340,18 @@ class GDAL2Tiles(object):
             # Function which generates SWNE in LatLong for given tile
             self.tileswne = self.mercator.TileLatLonBounds
 
-            # Generate table with min max tile coordinates for all zoomlevels
-            self.tminmax = list(range(0, 32))
-            for tz in range(0, 32):
-                tminx, tminy = self.mercator.MetersToTile(self.ominx, self.ominy, tz)
-                tmaxx, tmaxy = self.mercator.MetersToTile(self.omaxx, self.omaxy, tz)
-                # crop tiles extending world limits (+-180,+-90)
-                tminx, tminy = max(0, tminx), max(0, tminy)
-                tmaxx, tmaxy = min(2 ** tz - 1, tmaxx), min(2 ** tz - 1, tmaxy)
-                self.tminmax[tz] = (tminx, tminy, tmaxx, tmaxy)
+            # Generate table with min max tile coordinates for all zoomlevels,
+            # in one vectorized pass over the zoom axis
+            _load_numpy()
+            tz = numpy.arange(MAXZOOMLEVEL)
+            tminx, tminy = self.mercator.MetersToTileVec(self.ominx, self.ominy, tz)
+            tmaxx, tmaxy = self.mercator.MetersToTileVec(self.omaxx, self.omaxy, tz)
+            # crop tiles extending world limits (+-180,+-90)
+            world = 2 ** tz - 1
+            tminx, tminy = numpy.maximum(0, tminx), numpy.maximum(0, tminy)
+            tmaxx, tmaxy = numpy.minimum(world, tmaxx), numpy.minimum(world, tmaxy)
+            self.tminmax = list(zip(tminx.tolist(), tminy.tolist(),
+                                    tmaxx.tolist(), tmaxy.tolist()))
 
             # TODO: Maps crossing 180E (Alaska?)
 
@@ -1174,15 +1386,19 @@ class GDAL2Tiles(object):
             # Function which generates SWNE in LatLong for given tile
             self.tileswne = self.geodetic.TileLatLonBounds
 
-            # Generate table with min max tile coordinates for all zoomlevels
-            self.tminmax = list(range(0, 32))
-            for tz in range(0, 32):
-                tminx, tminy = self.geodetic.LonLatToTile(self.ominx, self.ominy, tz)
-                tmaxx, tmaxy = self.geodetic.LonLatToTile(self.omaxx, self.omaxy, tz)
-                # crop tiles extending world limits (+-180,+-90)
-                tminx, tminy = max(0, tminx), max(0, tminy)
-                tmaxx, tmaxy = min(2 ** (tz + 1) - 1, tmaxx), min(2 ** tz - 1, tmaxy)
-                self.tminmax[tz] = (tminx, tminy, tmaxx, tmaxy)
+            # Generate table with min max tile coordinates for all zoomlevels,
+            # in one vectorized pass over the zoom axis
+            _load_numpy()
+            tz = numpy.arange(MAXZOOMLEVEL)
+            tminx, tminy = self.geodetic.LonLatToTileVec(self.ominx, self.ominy, tz)
+            tmaxx, tmaxy = self.geodetic.LonLatToTileVec(self.omaxx, self.omaxy, tz)
+            # crop tiles extending world limits (+-180,+-90); the geodetic
+            # pyramid is two tiles wide at zoom 0
+            tminx, tminy = numpy.maximum(0, tminx), numpy.maximum(0, tminy)
+            tmaxx = numpy.minimum(2 ** (tz + 1) - 1, tmaxx)
+            tmaxy = numpy.minimum(2 ** tz - 1, tmaxy)
+            self.tminmax = list(zip(tminx.tolist(), tminy.tolist(),
+                                    tmaxx.tolist(), tmaxy.tolist()))
 
             # TODO: Maps crossing 180E (Alaska?)
 
@@ -1205,12 +1421,12 @@ class GDAL2Tiles(object):
 
         if self.options.profile == 'raster':
 
-            def log2(x):
-                return math.log10(x) / math.log10(2)
-
-            self.nativezoom = int(
-                max(math.ceil(log2(self.warped_input_dataset.RasterXSize / float(self.tilesize))),
-                    math.ceil(log2(self.warped_input_dataset.RasterYSize / float(self.tilesize)))))
+            # Smallest zoom where tilesize * 2**zoom covers both raster axes.
+            # Exact integer arithmetic - no float log rounding near powers of two
+            self.nativezoom = max(
+                0,
+                (-(-self.warped_input_dataset.RasterXSize // self.tilesize) - 1).bit_length(),
+                (-(-self.warped_input_dataset.RasterYSize // self.tilesize) - 1).bit_length())
 
             if self.options.verbose:
                 print("Native zoom of the raster:", self.nativezoom)
@@ -1223,34 +1439,36 @@ class GDAL2Tiles(object):
             if self.tmaxz is None:
                 self.tmaxz = self.nativezoom
 
-            # Generate table with min max tile coordinates for all zoomlevels
-            self.tminmax = list(range(0, self.tmaxz + 1))
-            self.tsize = list(range(0, self.tmaxz + 1))
-            for tz in range(0, self.tmaxz + 1):
-                tsize = 2.0 ** (self.nativezoom - tz) * self.tilesize
-                tminx, tminy = 0, 0
-                tmaxx = int(math.ceil(self.warped_input_dataset.RasterXSize / tsize)) - 1
-                tmaxy = int(math.ceil(self.warped_input_dataset.RasterYSize / tsize)) - 1
-                self.tsize[tz] = math.ceil(tsize)
-                self.tminmax[tz] = (tminx, tminy, tmaxx, tmaxy)
+            # Generate table with min max tile coordinates for all zoomlevels,
+            # in one vectorized pass over the zoom axis
+            _load_numpy()
+            tz = numpy.arange(self.tmaxz + 1)
+            tsize = 2.0 ** (self.nativezoom - tz) * self.tilesize
+            tmaxx = numpy.ceil(self.warped_input_dataset.RasterXSize / tsize).astype(int) - 1
+            tmaxy = numpy.ceil(self.warped_input_dataset.RasterYSize / tsize).astype(int) - 1
+            self.tsize = numpy.ceil(tsize).astype(int).tolist()
+            self.tminmax = [(0, 0, x, y) for x, y in zip(tmaxx.tolist(), tmaxy.tolist())]
 
             # Function which generates SWNE in LatLong for given tile
             if self.kml and self.in_srs_wkt:
                 ct = osr.CoordinateTransformation(in_srs, srs4326)
 
                 def rastertileswne(x, y, z):
-                    pixelsizex = (2 ** (self.tmaxz - z) * self.out_gt[1])  # X-pixel size in level
+                    pixelsizex = ((1 << (self.tmaxz - z)) * self.out_gt[1])  # X-pixel size in level
                     west = self.out_gt[0] + x * self.tilesize * pixelsizex
                     east = west + self.tilesize * pixelsizex
                     south = self.ominy + y * self.tilesize * pixelsizex
                     north = south + self.tilesize * pixelsizex
                     if not self.isepsg4326:
-                        # Transformation to EPSG:4326 (WGS84 datum)
-                        west, south = ct.TransformPoint(west, south)[:2]
-                        east, north = ct.TransformPoint(east, north)[:2]
+                        # Transformation to EPSG:4326 (WGS84 datum), both
+                        # corners in a single SWIG round-trip
+                        (west, south, _), (east, north, _) = ct.TransformPoints(
+                            [(west, south), (east, north)])
                     return south, west, north, east
 
-                self.tileswne = rastertileswne
+                # Neighbouring tiles share corners; memoize so each is
+                # transformed once
+                self.tileswne = lru_cache(maxsize=4096)(rastertileswne)
             else:
                 self.tileswne = lambda x, y, z: (0, 0, 0, 0)  # noqa
 
@@ -1260,8 +1478,13 @@ class GDAL2Tiles(object):
         tiles are generated during the tile processing).
         """
 
-        if not os.path.exists(self.output_folder):
-            os.makedirs(self.output_folder)
+        os.makedirs(self.output_folder, exist_ok=True)
+
+        def write_once(filename, make_content):
+            """Writes a metadata file unless --resume finds it already present"""
+            path = Path(self.output_folder, filename)
+            if not self.options.resume or not path.exists():
+                path.write_text(make_content(), encoding='utf-8')
 
         if self.options.profile == 'mercator':
 
@@ -1271,26 +1494,14 @@ class GDAL2Tiles(object):
             north, east = min(85.05112878, north), min(180.0, east)
             self.swne = (south, west, north, east)
 
-            # Generate googlemaps.html
-            if self.options.webviewer in ('all', 'google') and self.options.profile == 'mercator':
-                if (not self.options.resume or not
-                os.path.exists(os.path.join(self.output_folder, 'googlemaps.html'))):
-                    with open(os.path.join(self.output_folder, 'googlemaps.html'), 'wb') as f:
-                        f.write(self.generate_googlemaps().encode('utf-8'))
+            if self.options.webviewer in ('all', 'google'):
+                write_once('googlemaps.html', self.generate_googlemaps)
 
-            # Generate openlayers.html
             if self.options.webviewer in ('all', 'openlayers'):
-                if (not self.options.resume or not
-                os.path.exists(os.path.join(self.output_folder, 'openlayers.html'))):
-                    with open(os.path.join(self.output_folder, 'openlayers.html'), 'wb') as f:
-                        f.write(self.generate_openlayers().encode('utf-8'))
+                write_once('openlayers.html', self.generate_openlayers)
 
-            # Generate leaflet.html
             if self.options.webviewer in ('all', 'leaflet'):
-                if (not self.options.resume or not
-                os.path.exists(os.path.join(self.output_folder, 'leaflet.html'))):
-                    with open(os.path.join(self.output_folder, 'leaflet.html'), 'wb') as f:
-                        f.write(self.generate_leaflet().encode('utf-8'))
+                write_once('leaflet.html', self.generate_leaflet)
 
         elif self.options.profile == 'geodetic':
 
@@ -1300,12 +1511,8 @@ class GDAL2Tiles(object):
             north, east = min(90.0, north), min(180.0, east)
             self.swne = (south, west, north, east)
 
-            # Generate openlayers.html
             if self.options.webviewer in ('all', 'openlayers'):
-                if (not self.options.resume or not
-                os.path.exists(os.path.join(self.output_folder, 'openlayers.html'))):
-                    with open(os.path.join(self.output_folder, 'openlayers.html'), 'wb') as f:
-                        f.write(self.generate_openlayers().encode('utf-8'))
+                write_once('openlayers.html', self.generate_openlayers)
 
         elif self.options.profile == 'raster':
 
@@ -1314,35 +1521,14 @@ class GDAL2Tiles(object):
 
             self.swne = (south, west, north, east)
 
-            # Generate openlayers.html
             if self.options.webviewer in ('all', 'openlayers'):
-                if (not self.options.resume or not
-                os.path.exists(os.path.join(self.output_folder, 'openlayers.html'))):
-                    with open(os.path.join(self.output_folder, 'openlayers.html'), 'wb') as f:
-                        f.write(self.generate_openlayers().encode('utf-8'))
+                write_once('openlayers.html', self.generate_openlayers)
 
-        # Generate tilemapresource.xml.
-        if not self.options.resume or not os.path.exists(os.path.join(self.output_folder, 'tilemapresource.xml')):
-            with open(os.path.join(self.output_folder, 'tilemapresource.xml'), 'wb') as f:
-                f.write(self.generate_tilemapresource().encode('utf-8'))
+        write_once('tilemapresource.xml', self.generate_tilemapresource)
 
-        if self.kml:
-            # TODO: Maybe problem for not automatically generated tminz
-            # The root KML should contain links to all tiles in the tminz level
-            children = []
-            xmin, ymin, xmax, ymax = self.tminmax[self.tminz]
-            for x in range(xmin, xmax + 1):
-                for y in range(ymin, ymax + 1):
-                    children.append([x, y, self.tminz])
-            # Generate Root KML
-            if self.kml:
-                if (not self.options.resume or not
-                os.path.exists(os.path.join(self.output_folder, 'doc.kml'))):
-                    with open(os.path.join(self.output_folder, 'doc.kml'), 'wb') as f:
-                        f.write(generate_kml(
-                            None, None, None, self.tileext, self.tilesize, self.tileswne,
-                            self.options, children
-                        ).encode('utf-8'))
+        # The root doc.kml is written by generate_root_kml once tiling is
+        # done - all-nodata tiles are skipped without a KML file, so the
+        # root links can only be determined after the tminz level exists
 
     def generate_base_tiles(self):
         """
@@ -1375,34 +1561,50 @@ class GDAL2Tiles(object):
         tile_details = []
 
         tz = self.tmaxz
+
+        if self.options.profile in ('mercator', 'geodetic'):
+            # TileBounds is separable in tx/ty, so the bounds of the whole
+            # tile range reduce to two vectorized calls instead of one
+            # Python-level call per tile
+            _load_numpy()
+            tile_grid = self.mercator if self.options.profile == 'mercator' else self.geodetic
+            bxmin, _, bxmax, _ = tile_grid.TileBoundsVec(numpy.arange(tminx, tmaxx + 1), 0, tz)
+            _, bymin, _, bymax = tile_grid.TileBoundsVec(0, numpy.arange(tminy, tmaxy + 1), tz)
+
+        # The zoom directory and the tile basename are shared by whole rows of
+        # tiles - build them outside the per-tile loop
+        tz_dir = os.path.join(self.output_folder, str(tz))
+
+        # With --resume, one readdir per column replaces one stat per tile
+        existing = {}
+        if self.options.resume:
+            for tx in range(tminx, tmaxx + 1):
+                try:
+                    existing[tx] = {e.name for e in os.scandir(os.path.join(tz_dir, str(tx)))}
+                except FileNotFoundError:
+                    existing[tx] = set()
+
         for ty in range(tmaxy, tminy - 1, -1):
+            tile_name = "%s.%s" % (ty, self.tileext)
             for tx in range(tminx, tmaxx + 1):
 
                 ti += 1
-                tilefilename = os.path.join(
-                    self.output_folder, str(tz), str(tx), "%s.%s" % (ty, self.tileext))
+                tilefilename = os.path.join(tz_dir, str(tx), tile_name)
                 if self.options.verbose:
                     print(ti, '/', tcount, tilefilename)
 
-                if self.options.resume and os.path.exists(tilefilename):
+                if self.options.resume and tile_name in existing[tx]:
                     if self.options.verbose:
                         print("Tile generation skipped because of --resume")
                     continue
 
-                # Create directories for the tile
-                if not os.path.exists(os.path.dirname(tilefilename)):
-                    os.makedirs(os.path.dirname(tilefilename))
-
-                if self.options.profile == 'mercator':
-                    # Tile bounds in EPSG:3857
-                    b = self.mercator.TileBounds(tx, ty, tz)
-                elif self.options.profile == 'geodetic':
-                    b = self.geodetic.TileBounds(tx, ty, tz)
-
                 # Don't scale up by nearest neighbour, better change the querysize
                 # to the native resolution (and return smaller query tile) for scaling
 
                 if self.options.profile in ('mercator', 'geodetic'):
+                    # Tile bounds in EPSG:3857 (mercator) or EPSG:4326 (geodetic)
+                    b = (bxmin[tx - tminx], bymin[ty - tminy],
+                         bxmax[tx - tminx], bymax[ty - tminy])
                     rb, wb = self.geo_query(ds, b[0], b[3], b[2], b[1])
 
                     # Pixel size in the raster covering query geo extent
@@ -1481,38 +1683,40 @@ class GDAL2Tiles(object):
 
         raises Gdal2TilesError if the dataset does not contain anything inside this geo_query
         """
-        geotran = ds.GetGeoTransform()
-        rx = int((ulx - geotran[0]) / geotran[1] + 0.001)
-        ry = int((uly - geotran[3]) / geotran[5] + 0.001)
-        rxsize = int((lrx - ulx) / geotran[1] + 0.5)
-        rysize = int((lry - uly) / geotran[5] + 0.5)
+        # The geotransform never changes across a run; multiply by the
+        # cached inverses instead of re-fetching and dividing per call
+        geotran = self.out_gt
+        rx = int((ulx - geotran[0]) * self._inv_gt1 + 0.001)
+        ry = int((uly - geotran[3]) * self._inv_gt5 + 0.001)
+        rxsize = int((lrx - ulx) * self._inv_gt1 + 0.5)
+        rysize = int((lry - uly) * self._inv_gt5 + 0.5)
 
         if not querysize:
             wxsize, wysize = rxsize, rysize
         else:
             wxsize, wysize = querysize, querysize
 
-        # Coordinates should not go out of the bounds of the raster
+        # Coordinates should not go out of the bounds of the raster.
+        # Integer arithmetic throughout: the old float detour of the form
+        # int(size * (shift / size)) could truncate one pixel off the shift
         wx = 0
         if rx < 0:
-            rxshift = abs(rx)
-            wx = int(wxsize * (float(rxshift) / rxsize))
-            wxsize = wxsize - wx
-            rxsize = rxsize - int(rxsize * (float(rxshift) / rxsize))
+            wx = wxsize * -rx // rxsize
+            wxsize -= wx
+            rxsize += rx
             rx = 0
         if rx + rxsize > ds.RasterXSize:
-            wxsize = int(wxsize * (float(ds.RasterXSize - rx) / rxsize))
+            wxsize = wxsize * (ds.RasterXSize - rx) // rxsize
             rxsize = ds.RasterXSize - rx
 
         wy = 0
         if ry < 0:
-            ryshift = abs(ry)
-            wy = int(wysize * (float(ryshift) / rysize))
-            wysize = wysize - wy
-            rysize = rysize - int(rysize * (float(ryshift) / rysize))
+            wy = wysize * -ry // rysize
+            wysize -= wy
+            rysize += ry
             ry = 0
         if ry + rysize > ds.RasterYSize:
-            wysize = int(wysize * (float(ds.RasterYSize - ry) / rysize))
+            wysize = wysize * (ds.RasterYSize - ry) // rysize
             rysize = ds.RasterYSize - ry
 
         return (rx, ry, rxsize, rysize), (wx, wy, wxsize, wysize)
@@ -1543,7 +1747,7 @@ class GDAL2Tiles(object):
         else:
             args['srs'] = ""
 
-        s = """<?xml version="1.0" encoding="utf-8"?>
+        parts = ["""<?xml version="1.0" encoding="utf-8"?>
     <TileMap version="1.0.0" tilemapservice="http://tms.osgeo.org/1.0.0">
       <Title>%(title)s</Title>
       <Abstract></Abstract>
@@ -1552,21 +1756,20 @@ class GDAL2Tiles(object):
       <Origin x="%(west).14f" y="%(south).14f"/>
       <TileFormat width="%(tilesize)d" height="%(tilesize)d" mime-type="image/%(tileformat)s" extension="%(tileformat)s"/>
       <TileSets profile="%(profile)s">
-""" % args  # noqa
+""" % args]  # noqa
         for z in range(self.tminz, self.tmaxz + 1):
             if self.options.profile == 'raster':
-                s += """        <TileSet href="%s%d" units-per-pixel="%.14f" order="%d"/>\n""" % (
-                    args['publishurl'], z, (2 ** (self.nativezoom - z) * self.out_gt[1]), z)
+                units_per_pixel = 2 ** (self.nativezoom - z) * self.out_gt[1]
             elif self.options.profile == 'mercator':
-                s += """        <TileSet href="%s%d" units-per-pixel="%.14f" order="%d"/>\n""" % (
-                    args['publishurl'], z, 156543.0339 / 2 ** z, z)
-            elif self.options.profile == 'geodetic':
-                s += """        <TileSet href="%s%d" units-per-pixel="%.14f" order="%d"/>\n""" % (
-                    args['publishurl'], z, 0.703125 / 2 ** z, z)
-        s += """      </TileSets>
+                units_per_pixel = 156543.0339 / 2 ** z
+            else:  # 'geodetic'
+                units_per_pixel = 0.703125 / 2 ** z
+            parts.append("""        <TileSet href="%s%d" units-per-pixel="%.14f" order="%d"/>\n""" % (
+                args['publishurl'], z, units_per_pixel, z))
+        parts.append("""      </TileSets>
     </TileMap>
-    """
-        return s
+    """)
+        return ''.join(parts)
 
     def generate_googlemaps(self):
         """
@@ -2333,41 +2536,35 @@ def worker_tile_details(input_file, output_folder, options, send_pipe=None):
         print("worker_tile_details failed ", str(e))
 
 
-def progress_printer_thread(queue, nb_jobs):
-    pb = ProgressBar(nb_jobs)
-    pb.start()
-    for _ in range(nb_jobs):
-        queue.get()
-        pb.log_progress()
-        queue.task_done()
-
-
 class ProgressBar(object):
     def __init__(self, total_items):
         self.total_items = total_items
         self.nb_items_done = 0
         self.current_progress = 0
         self.STEP = 2.5
+        # Item count at which the bar next advances. Comparing against it is
+        # one integer add and compare per tile; the division, the stdout
+        # write and the flush only run when the bar actually moves
+        self._next_threshold = self.total_items * self.STEP / 100
 
     def start(self):
         sys.stdout.write("0")
+        sys.stdout.flush()
 
     def log_progress(self, nb_items=1):
         self.nb_items_done += nb_items
+        if self.nb_items_done < self._next_threshold:
+            return
         progress = float(self.nb_items_done) / self.total_items * 100
-        if progress >= self.current_progress + self.STEP:
-            done = False
-            while not done:
-                if self.current_progress + self.STEP <= progress:
-                    self.current_progress += self.STEP
-                    if self.current_progress % 10 == 0:
-                        sys.stdout.write(str(int(self.current_progress)))
-                        if self.current_progress == 100:
-                            sys.stdout.write("\n")
-                    else:
-                        sys.stdout.write(".")
-                else:
-                    done = True
+        while self.current_progress + self.STEP <= progress:
+            self.current_progress += self.STEP
+            if self.current_progress % 10 == 0:
+                sys.stdout.write(str(int(self.current_progress)))
+                if self.current_progress == 100:
+                    sys.stdout.write("\n")
+            else:
+                sys.stdout.write(".")
+        self._next_threshold = (self.current_progress + self.STEP) * self.total_items / 100
         sys.stdout.flush()
 
 
@@ -2379,26 +2576,27 @@ def get_tile_swne(tile_job_info, options):
         geodetic = GlobalGeodetic(options.tmscompatible)
         tile_swne = geodetic.TileLatLonBounds
     elif options.profile == 'raster':
-        srs4326 = osr.SpatialReference()
-        srs4326.ImportFromEPSG(4326)
         if tile_job_info.kml and tile_job_info.in_srs_wkt:
             in_srs = osr.SpatialReference()
             in_srs.ImportFromWkt(tile_job_info.in_srs_wkt)
-            ct = osr.CoordinateTransformation(in_srs, srs4326)
+            ct = osr.CoordinateTransformation(in_srs, srs_4326())
 
             def rastertileswne(x, y, z):
-                pixelsizex = (2 ** (tile_job_info.tmaxz - z) * tile_job_info.out_geo_trans[1])
-                west = tile_job_info.out_geo_trans[0] + x * tile_job_info.tilesize * pixelsizex
-                east = west + tile_job_info.tilesize * pixelsizex
-                south = tile_job_info.ominy + y * tile_job_info.tilesize * pixelsizex
-                north = south + tile_job_info.tilesize * pixelsizex
+                pixelsizex = ((1 << (tile_job_info.tmaxz - z)) * tile_job_info.out_geo_trans[1])
+                west = tile_job_info.out_geo_trans[0] + x * tile_job_info.tile_size * pixelsizex
+                east = west + tile_job_info.tile_size * pixelsizex
+                south = tile_job_info.ominy + y * tile_job_info.tile_size * pixelsizex
+                north = south + tile_job_info.tile_size * pixelsizex
                 if not tile_job_info.is_epsg_4326:
-                    # Transformation to EPSG:4326 (WGS84 datum)
-                    west, south = ct.TransformPoint(west, south)[:2]
-                    east, north = ct.TransformPoint(east, north)[:2]
+                    # Transformation to EPSG:4326 (WGS84 datum), both corners
+                    # in a single SWIG round-trip
+                    (west, south, _), (east, north, _) = ct.TransformPoints(
+                        [(west, south), (east, north)])
                 return south, west, north, east
 
-            tile_swne = rastertileswne
+            # Neighbouring tiles share corners; memoize so each is
+            # transformed once
+            tile_swne = lru_cache(maxsize=4096)(rastertileswne)
         else:
             tile_swne = lambda x, y, z: (0, 0, 0, 0)  # noqa
     else:
@@ -2407,6 +2605,37 @@ def get_tile_swne(tile_job_info, options):
     return tile_swne
 
 
+def generate_root_kml(tile_job_info, output_folder, options):
+    """Writes the root doc.kml linking the tminz tiles that were actually written
+
+    Runs after tiling rather than with the other metadata: all-nodata tiles
+    (and their per-tile KML) are skipped entirely, and the root document
+    must not link to files that do not exist
+    """
+    if not tile_job_info.kml:
+        return
+
+    doc_path = os.path.join(output_folder, 'doc.kml')
+    if options.resume and os.path.exists(doc_path):
+        return
+
+    tminz = tile_job_info.tminz
+    tminx, tminy, tmaxx, tmaxy = tile_job_info.tminmax[tminz]
+    children = []
+    for x in range(tminx, tmaxx + 1):
+        for y in range(tminy, tmaxy + 1):
+            if os.path.exists(os.path.join(
+                    output_folder, str(tminz), str(x),
+                    "%s.%s" % (y, tile_job_info.tile_extension))):
+                children.append([x, y, tminz])
+
+    with open(doc_path, 'wb') as f:
+        f.write(generate_kml(
+            None, None, None, tile_job_info.tile_extension, tile_job_info.tile_size,
+            get_tile_swne(tile_job_info, options), options, children
+        ).encode('utf-8'))
+
+
 def single_threaded_tiling(input_file, output_folder, options):
     """
     Keep a single threaded version that stays clear of multiprocessing, for platforms that would not
@@ -2419,6 +2648,8 @@ def single_threaded_tiling(input_file, output_folder, options):
     if options.verbose:
         print("Tiles details calc complete.")
 
+    pre_create_tile_directories(output_folder, conf.tminmax, conf.tminz, conf.tmaxz)
+
     if not options.verbose and not options.quiet:
         progress_bar = ProgressBar(len(tile_details))
         progress_bar.start()
@@ -2430,10 +2661,47 @@ def single_threaded_tiling(input_file, output_folder, options):
             progress_bar.log_progress()
 
     create_overview_tiles(conf, output_folder, options)
+    generate_root_kml(conf, output_folder, options)
 
     shutil.rmtree(os.path.dirname(conf.src_file))
 
 
+def mpi_world_size():
+    """Number of MPI ranks this process was launched with, 1 outside of mpiexec"""
+    for var in ('OMPI_COMM_WORLD_SIZE', 'PMI_SIZE', 'MPI_LOCALNRANKS'):
+        if var in os.environ:
+            return int(os.environ[var])
+    return 1
+
+
+class MPIPoolAdapter(object):
+    """Adapts an MPIPoolExecutor to the subset of the multiprocessing Pool API used here"""
+
+    def __init__(self, initializer=None, initargs=()):
+        self.executor = MPIPoolExecutor(initializer=initializer, initargs=initargs)
+
+    def imap_unordered(self, func, iterable, chunksize=1):
+        return self.executor.map(func, iterable, chunksize=chunksize, unordered=True)
+
+    def apply_async(self, func, args):
+        future = self.executor.submit(func, *args)
+        future.get = future.result
+        return future
+
+    def close(self):
+        pass
+
+    def join(self):
+        self.executor.shutdown(wait=True)
+
+
+def tiling_pool(nb_processes, initializer=None, initargs=()):
+    """A pool of workers, spanning MPI ranks when launched under mpiexec"""
+    if MPIPoolExecutor is not None and mpi_world_size() > 1:
+        return MPIPoolAdapter(initializer=initializer, initargs=initargs)
+    return Pool(processes=nb_processes, initializer=initializer, initargs=initargs)
+
+
 def multi_threaded_tiling(input_file, output_folder, options):
     nb_processes = options.nb_processes or 1
     (conf_receiver, conf_sender) = Pipe(False)
@@ -2451,26 +2719,33 @@ def multi_threaded_tiling(input_file, output_folder, options):
     p.join()
     if options.verbose:
         print("Tiles details calc complete.")
-    # Have to create the Queue through a multiprocessing.Manager to get a Queue Proxy,
-    # otherwise you can't pass it as a param in the method invoked by the pool...
-    manager = Manager()
-    queue = manager.Queue()
-    pool = Pool(processes=nb_processes)
-    # TODO: gbataille - check the confs for which each element is an array... one useless level?
-    # TODO: gbataille - assign an ID to each job for print in verbose mode "ReadRaster Extent ..."
-    # TODO: gbataille - check memory footprint and time on big image. are they opened x times
-    for tile_detail in tile_details:
-        pool.apply_async(create_base_tile, (conf, tile_detail), {"queue": queue})
+
+    pre_create_tile_directories(output_folder, conf.tminmax, conf.tminz, conf.tmaxz)
 
     if not options.verbose and not options.quiet:
-        p = Process(target=progress_printer_thread, args=[queue, len(tile_details)])
-        p.start()
+        progress_bar = ProgressBar(len(tile_details))
+        progress_bar.start()
+
+    pool = tiling_pool(nb_processes, initializer=_init_worker,
+                       initargs=(conf.src_file,
+                                 gdal_cache_bytes_per_worker(options, nb_processes)))
+    # TODO: gbataille - assign an ID to each job for print in verbose mode "ReadRaster Extent ..."
+    for _ in pool.imap_unordered(partial(create_base_tile, conf), tile_details,
+                                 chunksize=options.chunksize):
+        if not options.verbose and not options.quiet:
+            progress_bar.log_progress()
 
     pool.close()
     pool.join()  # Jobs finished
-    if not options.verbose and not options.quiet:
-        p.join()  # Traces done
 
-    create_overview_tiles(conf, output_folder, options)
+    # Overview workers read and write tiles through GDAL too; under spawn
+    # they would otherwise start without the runtime tuning applied
+    pool = tiling_pool(nb_processes, initializer=set_gdal_runtime_defaults,
+                       initargs=(gdal_cache_bytes_per_worker(options, nb_processes),))
+    create_overview_tiles(conf, output_folder, options, pool=pool)
+    pool.close()
+    pool.join()
+
+    generate_root_kml(conf, output_folder, options)
 
     shutil.rmtree(os.path.dirname(conf.src_file))
@@ -49,10 +49,14 @@ class GlobalGeodetic(object):
             # Adheres OpenLayers, MapProxy, etc default resolution for WMTS
             self.resFact = 360.0 / self.tileSize
 
+        # Per-zoom resolution table: Resolution() runs once per tile in the
+        # hot loops, and an index beats recomputing the division every call
+        self._res = tuple(self.resFact / (1 << z) for z in range(MAXZOOMLEVEL))
+
     def LonLatToPixels(self, lon, lat, zoom):
         "Converts lon/lat to pixel coordinates in given zoom of the EPSG:4326 pyramid"
 
-        res = self.resFact / 2 ** zoom
+        res = self._res[zoom]
         px = (180 + lon) / res
         py = (90 + lat) / res
         return px, py
@@ -73,7 +77,7 @@ class GlobalGeodetic(object):
     def Resolution(self, zoom):
         "Resolution (arc/pixel) for given zoom level (measured at Equator)"
 
-        return self.resFact / 2 ** zoom
+        return self._res[zoom]
 
     def ZoomForPixelSize(self, pixelSize):
         "Maximal scaledown zoom of the pyramid closest to the pixelSize."
@@ -87,7 +91,32 @@ class GlobalGeodetic(object):
 
     def TileBounds(self, tx, ty, zoom):
         "Returns bounds of the given tile"
+        res = self._res[zoom]
+        return (
+            tx * self.tileSize * res - 180,
+            ty * self.tileSize * res - 90,
+            (tx + 1) * self.tileSize * res - 180,
+            (ty + 1) * self.tileSize * res - 90
+        )
+
+    def LonLatToTileVec(self, lon, lat, zoom):
+        "Vectorized LonLatToTile over a NumPy array of zoom levels"
+        import numpy
+
+        res = self.resFact / 2.0 ** numpy.asarray(zoom)
+        px = (180 + lon) / res
+        py = (90 + lat) / res
+        tx = numpy.ceil(px / self.tileSize).astype(int) - 1
+        ty = numpy.ceil(py / self.tileSize).astype(int) - 1
+        return tx, ty
+
+    def TileBoundsVec(self, tx, ty, zoom):
+        "Vectorized TileBounds over NumPy arrays of tile coordinates"
+        import numpy
+
         res = self.resFact / 2 ** zoom
+        tx = numpy.asarray(tx)
+        ty = numpy.asarray(ty)
         return (
             tx * self.tileSize * res - 180,
             ty * self.tileSize * res - 90,
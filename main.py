@@ -1,7 +1,9 @@
 import gdal
+import multiprocessing
 import sys
 from gdal2tiles import single_threaded_tiling, \
-    multi_threaded_tiling, process_args
+    multi_threaded_tiling, process_args, \
+    set_gdal_runtime_defaults, gdal_cache_bytes_per_worker
 
 # TODO:
 __doc__globalmaptiles = """
@@ -19,11 +21,16 @@ def main():
     input_file, output_folder, options = process_args(argv[1:])
     nb_processes = options.nb_processes or 1
 
+    set_gdal_runtime_defaults(gdal_cache_bytes_per_worker(options, nb_processes))
+
     if nb_processes == 1:
         single_threaded_tiling(input_file, output_folder, options)
     else:
         multi_threaded_tiling(input_file, output_folder, options)
 
 
-if __name__ == '__main__':
+if __name__ == '__main__' and multiprocessing.current_process().name == 'MainProcess':
+    # The extra guard keeps argv parsing and GDAL setup out of pool workers
+    # under the 'spawn' start method (Windows, macOS), which re-import this
+    # module on startup
     main()
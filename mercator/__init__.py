@@ -108,6 +108,9 @@ class GlobalMercator(object):
         # 156543.03392804062 for tileSize 256 pixels
         self.originShift = 2 * math.pi * 6378137 / 2.0
         # 20037508.342789244
+        # Per-zoom resolution table: Resolution() runs once per tile in the
+        # hot loops, and an index beats recomputing the division every call
+        self._res = tuple(self.initialResolution / (1 << z) for z in range(MAXZOOMLEVEL))
 
     def LatLonToMeters(self, lat, lon):
         "Converts given lat/lon in WGS84 Datum to XY in Spherical Mercator EPSG:3857"
@@ -178,11 +181,54 @@ class GlobalMercator(object):
 
         return (minLat, minLon, maxLat, maxLon)
 
+    def MetersToTileVec(self, mx, my, zoom):
+        "Vectorized MetersToTile over a NumPy array of zoom levels"
+        import numpy
+
+        res = self.initialResolution / 2.0 ** numpy.asarray(zoom)
+        px = (mx + self.originShift) / res
+        py = (my + self.originShift) / res
+        tx = numpy.ceil(px / self.tileSize).astype(int) - 1
+        ty = numpy.ceil(py / self.tileSize).astype(int) - 1
+        return tx, ty
+
+    def MetersToLatLonVec(self, mx, my):
+        "Vectorized MetersToLatLon over NumPy arrays of EPSG:3857 coordinates"
+        import numpy
+
+        lon = (numpy.asarray(mx) / self.originShift) * 180.0
+        lat = (numpy.asarray(my) / self.originShift) * 180.0
+
+        lat = 180 / math.pi * (2 * numpy.arctan(numpy.exp(lat * math.pi / 180.0)) - math.pi / 2.0)
+        return lat, lon
+
+    def TileBoundsVec(self, tx, ty, zoom):
+        "Vectorized TileBounds over NumPy arrays of tile coordinates"
+        import numpy
+
+        res = self.Resolution(zoom)
+        tx = numpy.asarray(tx)
+        ty = numpy.asarray(ty)
+        minx = tx * self.tileSize * res - self.originShift
+        miny = ty * self.tileSize * res - self.originShift
+        maxx = (tx + 1) * self.tileSize * res - self.originShift
+        maxy = (ty + 1) * self.tileSize * res - self.originShift
+        return minx, miny, maxx, maxy
+
+    def TileLatLonBoundsVec(self, tx, ty, zoom):
+        "Vectorized TileLatLonBounds over NumPy arrays of tile coordinates"
+
+        minx, miny, maxx, maxy = self.TileBoundsVec(tx, ty, zoom)
+        minLat, minLon = self.MetersToLatLonVec(minx, miny)
+        maxLat, maxLon = self.MetersToLatLonVec(maxx, maxy)
+
+        return minLat, minLon, maxLat, maxLon
+
     def Resolution(self, zoom):
         "Resolution (meters/pixel) for given zoom level (measured at Equator)"
 
         # return (2 * math.pi * 6378137) / (self.tileSize * 2**zoom)
-        return self.initialResolution / (2 ** zoom)
+        return self._res[zoom]
 
     def ZoomForPixelSize(self, pixelSize):
         "Maximal scaledown zoom of the pyramid closest to the pixelSize."
@@ -198,13 +244,13 @@ class GlobalMercator(object):
         "Converts TMS tile coordinates to Google Tile coordinates"
 
         # coordinate origin is moved from bottom-left to top-left corner of the extent
-        return tx, (2 ** zoom - 1) - ty
+        return tx, ((1 << zoom) - 1) - ty
 
     def QuadTree(self, tx, ty, zoom):
         "Converts TMS tile coordinates to Microsoft QuadTree"
 
         quadKey = ""
-        ty = (2 ** zoom - 1) - ty
+        ty = ((1 << zoom) - 1) - ty
         for i in range(zoom, 0, -1):
             digit = 0
             mask = 1 << (i - 1)